@@ -1,17 +1,36 @@
 """
 CLI principal de tuya-pip.
 """
+from __future__ import annotations
+
 import typer
-import subprocess
 import sys
-import asyncio
 import os
 import re
-from typing import Optional, List
+from typing import TYPE_CHECKING, BinaryIO, Callable, Optional, List
 from pathlib import Path
-from .validator import FirewallValidator
 from . import ui
 
+# asyncio, subprocess y httpx (vía validator) se importan dentro de los comandos
+# que los usan para que --version y --help arranquen rápido
+if TYPE_CHECKING:
+    from .validator import FirewallValidator, ValidationResult
+
+# Operadores de versión; los de dos caracteres van primero para que la regex los prefiera
+_SEPARATORS = ("==", ">=", "<=", "~=", "!=", ">", "<")
+
+# Nombre del paquete seguido opcionalmente de un operador y versión
+_SPEC_RE = re.compile(
+    r"^\s*([^\s=<>~!;]+)\s*(?:(" + "|".join(map(re.escape, _SEPARATORS)) + r")\s*([^\s;]*))?"
+)
+
+# Nombre y versión del paquete en URLs de archivos rechazados por el firewall
+# Ejemplo: http://127.0.0.1:8000/pypi/packages/numpy-2.3.5-cp313-cp313-win_amd64.whl.metadata
+_PKG_403_RE = re.compile(rb'/packages/([a-zA-Z0-9_-]+)-([\d\.]+[a-zA-Z0-9\.]*)')
+
+# Tamaño de bloque para leer la salida de pip
+_PIP_READ_SIZE = 64 * 1024
+
 app = typer.Typer(
     name="tuya-pip",
     help="🛡️ Secure pip wrapper with firewall validation",
@@ -19,6 +38,20 @@ app = typer.Typer(
 )
 
 
+def run_async(coro):
+    """Ejecuta una corrutina sobre uvloop si está instalado, o con asyncio.run"""
+    import asyncio
+    
+    try:
+        import uvloop
+    except ImportError:  # Dependencia opcional (no disponible en Windows)
+        uvloop = None
+    
+    if uvloop is not None:
+        return uvloop.run(coro)
+    return asyncio.run(coro)
+
+
 def get_firewall_url() -> str:
     """Obtiene la URL del firewall desde variable de entorno o usa la por defecto"""
     return os.getenv("TUYA_FIREWALL_URL", "http://127.0.0.1:8000")
@@ -34,51 +67,149 @@ def parse_package_spec(package_spec: str) -> tuple[str, Optional[str]]:
     Returns:
         Tuple con (nombre_paquete, versión o None)
     """
-    # Manejar diferentes formatos: ==, >=, <=, >, <, ~=
-    for separator in ["==", ">=", "<=", ">", "<", "~="]:
-        if separator in package_spec:
-            parts = package_spec.split(separator)
-            return parts[0].strip(), parts[1].strip() if separator == "==" else None
+    match = _SPEC_RE.match(package_spec)
+    if not match:
+        return package_spec.strip(), None
     
-    return package_spec.strip(), None
+    name, operator, version = match.groups()
+    return name, version if operator == "==" and version else None
 
 
-async def validate_packages(packages: List[str], firewall_url: str) -> bool:
+class _Blocked(Exception):
+    """Señala que un paquete fue bloqueado para cancelar las validaciones restantes"""
+    
+    def __init__(self, result: ValidationResult):
+        super().__init__(result.reason)
+        self.result = result
+
+
+async def validate_packages(
+    packages: List[str],
+    firewall_url: str,
+    use_cache: bool = True
+) -> bool:
     """
     Valida una lista de paquetes contra el firewall.
     
     Args:
         packages: Lista de especificaciones de paquetes
         firewall_url: URL del firewall
+        use_cache: Reutilizar resultados de validación recientes
     
     Returns:
         True si todos los paquetes pasan, False si alguno es bloqueado
     """
-    validator = FirewallValidator(firewall_url)
+    from .validator import FirewallValidator
+    
+    # Cada ejecución crea y cierra su propio validador: los clientes httpx quedan
+    # ligados al event loop que los creó y no pueden reutilizarse entre comandos
+    validator = FirewallValidator(firewall_url, use_cache=use_cache)
+    specs = [parse_package_spec(package_spec) for package_spec in packages]
     
     try:
-        for package_spec in packages:
-            package_name, version = parse_package_spec(package_spec)
-            
-            with ui.show_checking_spinner(package_spec):
-                result = await validator.validate_package(package_name, version)
+        # Un solo Progress para todo el lote, con un spinner por paquete
+        with ui.batch_progress() as progress:
+            task_ids = [ui.add_checking_task(progress, package_spec) for package_spec in packages]
             
-            if result.status == "block":
-                audit_url = f"{firewall_url}/blocked/{package_name}"
-                version_str = version if version else "latest"
-                ui.show_blocked_panel(
-                    package=package_name,
-                    version=version_str,
-                    reason=result.reason,
-                    audit_url=audit_url
+            # Una sola petición para todos los paquetes si el firewall lo soporta
+            results = await validator.validate_batch(specs)
+            if results is None:
+                results = await _validate_concurrently(
+                    validator,
+                    specs,
+                    on_done=lambda i: progress.remove_task(task_ids[i])
                 )
-                return False
-            else:
-                ui.show_success(package_spec)
-        
-        return True
     finally:
         await validator.close()
+    
+    # Mostrar resultados en el orden original y reunir los bloqueos para
+    # renderizarlos una sola vez
+    blocked: List[tuple[str, str, str, str]] = []
+    for package_spec, (package_name, version), result in zip(packages, specs, results):
+        if result is None:
+            # Validación cancelada tras un bloqueo
+            continue
+        
+        if result.status == "block":
+            audit_url = f"{firewall_url}/blocked/{package_name}"
+            version_str = version if version else "latest"
+            blocked.append((package_name, version_str, result.reason, audit_url))
+        else:
+            ui.show_success(package_spec)
+    
+    if len(blocked) == 1:
+        package_name, version_str, reason, audit_url = blocked[0]
+        ui.show_blocked_panel(
+            package=package_name,
+            version=version_str,
+            reason=reason,
+            audit_url=audit_url
+        )
+    elif blocked:
+        ui.show_blocked_table(blocked)
+    
+    return not blocked
+
+
+async def _validate_concurrently(
+    validator: FirewallValidator,
+    specs: List[tuple[str, Optional[str]]],
+    on_done: Optional[Callable[[int], None]] = None
+) -> List[Optional[ValidationResult]]:
+    """
+    Valida cada paquete con su propia petición, todas en paralelo.
+    
+    El primer bloqueo cancela las validaciones pendientes, cuyo resultado es None.
+    on_done se invoca con el índice de cada paquete cuya validación termina.
+    """
+    import asyncio
+    from .validator import ValidationResult
+    
+    async def check_package(
+        index: int,
+        package_name: str,
+        version: Optional[str]
+    ) -> ValidationResult:
+        result = await validator.validate_package(package_name, version)
+        if on_done:
+            on_done(index)
+        if result.status == "block":
+            raise _Blocked(result)
+        return result
+    
+    # La latencia total pasa a ser la de la consulta más lenta en lugar de la suma de todas
+    tasks = [
+        asyncio.create_task(check_package(i, package_name, version))
+        for i, (package_name, version) in enumerate(specs)
+    ]
+    
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    
+    results: List[Optional[ValidationResult]] = []
+    for (package_name, _), task in zip(specs, tasks):
+        if task.cancelled():
+            results.append(None)
+            continue
+        
+        error = task.exception()
+        if isinstance(error, _Blocked):
+            results.append(error.result)
+        elif error is not None:
+            results.append(ValidationResult(
+                status="block",
+                reason=f"Validation error: {str(error)}",
+                details={"package": package_name, "error": str(error)}
+            ))
+        else:
+            results.append(task.result())
+    
+    return results
 
 
 def parse_requirements_file(requirements_file: str) -> List[str]:
@@ -91,18 +222,9 @@ def parse_requirements_file(requirements_file: str) -> List[str]:
     Returns:
         Lista de especificaciones de paquetes
     """
-    packages = []
-    
     try:
-        with open(requirements_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                # Ignorar líneas vacías y comentarios
-                if line and not line.startswith('#'):
-                    # Remover comentarios inline
-                    if '#' in line:
-                        line = line.split('#')[0].strip()
-                    packages.append(line)
+        with open(requirements_file, 'r', encoding='utf-8', buffering=64 * 1024) as f:
+            lines = f.read().splitlines()
     except FileNotFoundError:
         ui.show_error(f"Requirements file not found: {requirements_file}")
         sys.exit(1)
@@ -110,7 +232,54 @@ def parse_requirements_file(requirements_file: str) -> List[str]:
         ui.show_error(f"Error reading requirements file: {str(e)}")
         sys.exit(1)
     
-    return packages
+    # Remover comentarios (completos o inline) e ignorar líneas vacías
+    return [
+        package
+        for line in lines
+        if (package := line.partition('#')[0].strip())
+    ]
+
+
+def stream_pip_output(stream: BinaryIO, out: BinaryIO) -> List[str]:
+    """
+    Reenvía la salida de pip y detecta los paquetes rechazados por el firewall.
+    
+    Args:
+        stream: Salida binaria del proceso pip
+        out: Destino binario donde reenviar la salida (ej: sys.stdout.buffer)
+    
+    Returns:
+        Lista sin duplicados de paquetes bloqueados ("nombre==versión"), en orden
+    """
+    # El set evita duplicados en O(1); la lista conserva el orden para mostrarlos
+    seen: set[str] = set()
+    blocked_packages: List[str] = []
+    
+    def scan(lines: List[bytes]):
+        for line in lines:
+            # Detectar errores 403 y extraer el nombre del paquete bloqueado con su versión
+            if b"HTTP error 403" in line or b"403 Client Error: Forbidden" in line:
+                # Extraer nombre y versión del paquete de la URL
+                match = _PKG_403_RE.search(line)
+                if match:
+                    pkg_name = match.group(1).decode("ascii").lower()
+                    pkg_version = match.group(2).decode("ascii")
+                    pkg_info = f"{pkg_name}=={pkg_version}"
+                    if pkg_info not in seen:
+                        seen.add(pkg_info)
+                        blocked_packages.append(pkg_info)
+    
+    pending = b""
+    
+    # Reenviar la salida por bloques y analizar solo las líneas completas
+    while chunk := stream.read1(_PIP_READ_SIZE):
+        out.write(chunk)
+        out.flush()
+        *lines, pending = (pending + chunk).split(b"\n")
+        scan(lines)
+    scan([pending])
+    
+    return blocked_packages
 
 
 @app.command()
@@ -122,6 +291,11 @@ def install(
         "-f",
         help="Skip security validation (use with caution)"
     ),
+    no_cache: bool = typer.Option(
+        False,
+        "--no-cache",
+        help="Ignore cached validation results and query the firewall"
+    ),
     upgrade: bool = typer.Option(
         False,
         "--upgrade",
@@ -190,7 +364,11 @@ def install(
     else:
         # Validar paquetes contra el firewall
         firewall_url = get_firewall_url()
-        all_passed = asyncio.run(validate_packages(packages_to_install, firewall_url))
+        all_passed = run_async(validate_packages(
+            packages_to_install,
+            firewall_url,
+            use_cache=not no_cache
+        ))
         
         if not all_passed:
             ui.show_error("Installation aborted due to security policy violations")
@@ -199,68 +377,49 @@ def install(
     # Construir comando pip
     ui.show_installing(", ".join(packages_to_install))
     
-    pip_args = ["pip", "install"]
-    
-    if requirement:
-        pip_args.extend(["-r", requirement])
-    else:
-        pip_args.extend(packages_to_install)
-    
-    if upgrade:
-        pip_args.append("--upgrade")
-    
-    if index_url:
-        pip_args.extend(["--index-url", index_url])
-    
-    if extra_index_url:
-        pip_args.extend(["--extra-index-url", extra_index_url])
-    
-    if trusted_host:
-        pip_args.extend(["--trusted-host", trusted_host])
-    
-    if no_deps:
-        pip_args.append("--no-deps")
+    # Tabla (condición, argumentos) para construir el comando en una sola pasada
+    pip_spec = [
+        (True, ["pip", "install"]),
+        (requirement, ["-r", requirement]),
+        (not requirement, packages_to_install),
+        (upgrade, ["--upgrade"]),
+        (index_url, ["--index-url", index_url]),
+        (extra_index_url, ["--extra-index-url", extra_index_url]),
+        (trusted_host, ["--trusted-host", trusted_host]),
+        (no_deps, ["--no-deps"]),
+    ]
+    pip_args = [arg for condition, args in pip_spec if condition for arg in args]
     
     # Ejecutar pip install con streaming para capturar errores en tiempo real
+    import subprocess
+    
     try:
+        # Resolver la salida binaria antes de lanzar pip para no dejar el proceso
+        # huérfano si stdout no la tiene
+        sys.stdout.flush()
+        out = sys.stdout.buffer
+        
+        # Leer la salida como bytes: solo se buscan subcadenas ASCII, así que no
+        # hace falta decodificar ni traducir saltos de línea
         process = subprocess.Popen(
             pip_args,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
+            bufsize=_PIP_READ_SIZE
         )
         
-        blocked_packages = []
-        
-        # Leer la salida línea por línea
-        for line in process.stdout:
-            print(line, end='')
-            
-            # Detectar errores 403 y extraer el nombre del paquete bloqueado con su versión
-            if "HTTP error 403" in line or "403 Client Error: Forbidden" in line:
-                # Extraer nombre y versión del paquete de la URL
-                # Ejemplo: http://127.0.0.1:8000/pypi/packages/numpy-2.3.5-cp313-cp313-win_amd64.whl.metadata
-                match = re.search(r'/packages/([a-zA-Z0-9_-]+)-([\d\.]+[a-zA-Z0-9\.]*)', line)
-                if match:
-                    pkg_name = match.group(1).lower()
-                    pkg_version = match.group(2)
-                    pkg_info = f"{pkg_name}=={pkg_version}"
-                    if pkg_info not in blocked_packages:
-                        blocked_packages.append(pkg_info)
-        
+        blocked_packages = stream_pip_output(process.stdout, out)
         process.wait()
         
         # Si hubo paquetes bloqueados, mostrar mensaje informativo
         if blocked_packages and process.returncode != 0:
-            ui.console.print()
+            ui.get_console().print()
             ui.show_error(f"Firewall blocked {len(blocked_packages)} package(s)")
             
             for pkg in blocked_packages:
-                ui.console.print(f"  [red]✗[/red] {pkg}")
+                ui.get_console().print(f"  [red]✗[/red] {pkg}")
             
-            ui.console.print()
+            ui.get_console().print()
             ui.show_info(f"For details, run: tuya-pip audit {blocked_packages[0]}")
         
         sys.exit(process.returncode)
@@ -284,44 +443,43 @@ def audit(
     # Extraer solo el nombre del paquete (remover versión si existe)
     package_name, _ = parse_package_spec(package)
     
+    from .validator import FirewallValidatorSync
+    
     firewall_url = get_firewall_url()
-    validator = FirewallValidator(firewall_url)
+    validator = FirewallValidatorSync(firewall_url)
     
-    async def run_audit():
-        try:
-            with ui.show_checking_spinner(package_name):
-                blocked_info = await validator.get_blocked_info(package_name)
-            
-            if blocked_info.get("status") == "blocked":
-                reasons = blocked_info.get("reasons", [])
-                reason_text = "; ".join(reasons) if reasons else "No specific reason provided"
-                blocked_count = blocked_info.get("blocked_versions", 0)
-                
-                ui.show_blocked_panel(
-                    package=package_name,
-                    version=f"{blocked_count} version(s)",
-                    reason=reason_text,
-                    audit_url=f"{firewall_url}/blocked/{package_name}"
-                )
-                
-                # Mostrar detalles adicionales si están disponibles
-                if "blocked_versions_list" in blocked_info:
-                    versions = blocked_info["blocked_versions_list"]
-                    if versions:
-                        ui.console.print(f"\n[bold]Blocked versions:[/bold] {', '.join(versions)}")
-                
-            elif blocked_info.get("status") == "allowed":
-                ui.console.print(f"\n✅ [green]Package '{package_name}' is allowed[/green]")
-                ui.console.print(f"[dim]No versions are currently blocked by the firewall[/dim]")
-            elif blocked_info.get("status") == "error":
-                error_msg = blocked_info.get("error", "Unknown error")
-                ui.show_error(f"Error checking package: {error_msg}")
-            else:
-                ui.show_info(f"Package status: {blocked_info.get('status', 'unknown')}")
-        finally:
-            await validator.close()
-    
-    asyncio.run(run_audit())
+    try:
+        with ui.show_checking_spinner(package_name):
+            blocked_info = validator.get_blocked_info(package_name)
+    finally:
+        validator.close()
+    
+    if blocked_info.get("status") == "blocked":
+        reasons = blocked_info.get("reasons", [])
+        reason_text = "; ".join(reasons) if reasons else "No specific reason provided"
+        blocked_count = blocked_info.get("blocked_versions", 0)
+        
+        ui.show_blocked_panel(
+            package=package_name,
+            version=f"{blocked_count} version(s)",
+            reason=reason_text,
+            audit_url=f"{firewall_url}/blocked/{package_name}"
+        )
+        
+        # Mostrar detalles adicionales si están disponibles
+        if "blocked_versions_list" in blocked_info:
+            versions = blocked_info["blocked_versions_list"]
+            if versions:
+                ui.get_console().print(f"\n[bold]Blocked versions:[/bold] {', '.join(versions)}")
+        
+    elif blocked_info.get("status") == "allowed":
+        ui.get_console().print(f"\n✅ [green]Package '{package_name}' is allowed[/green]")
+        ui.get_console().print(f"[dim]No versions are currently blocked by the firewall[/dim]")
+    elif blocked_info.get("status") == "error":
+        error_msg = blocked_info.get("error", "Unknown error")
+        ui.show_error(f"Error checking package: {error_msg}")
+    else:
+        ui.show_info(f"Package status: {blocked_info.get('status', 'unknown')}")
 
 
 @app.command()
@@ -339,24 +497,23 @@ def check(
         tuya-pip check
         tuya-pip check --url http://localhost:8000
     """
+    from .validator import FirewallValidatorSync
+    
     url = firewall_url or get_firewall_url()
-    validator = FirewallValidator(url)
+    validator = FirewallValidatorSync(url)
     
-    async def run_check():
-        try:
-            with ui.show_checking_spinner("firewall connectivity"):
-                is_reachable = await validator.check_connectivity()
-            
-            if is_reachable:
-                ui.console.print(f"\n✅ [green]Firewall is reachable at {url}[/green]")
-            else:
-                ui.console.print(f"\n❌ [red]Firewall is not reachable at {url}[/red]")
-                ui.console.print(f"[dim]Make sure python-package-firewall is running[/dim]")
-                sys.exit(1)
-        finally:
-            await validator.close()
+    try:
+        with ui.show_checking_spinner("firewall connectivity"):
+            is_reachable = validator.check_connectivity()
+    finally:
+        validator.close()
     
-    asyncio.run(run_check())
+    if is_reachable:
+        ui.get_console().print(f"\n✅ [green]Firewall is reachable at {url}[/green]")
+    else:
+        ui.get_console().print(f"\n❌ [red]Firewall is not reachable at {url}[/red]")
+        ui.get_console().print(f"[dim]Make sure python-package-firewall is running[/dim]")
+        sys.exit(1)
 
 
 @app.callback(invoke_without_command=True)
@@ -374,7 +531,7 @@ def main(
     Validates packages against python-package-firewall before installation.
     """
     if version:
-        ui.console.print("tuya-pip version 0.1.0")
+        typer.echo("tuya-pip version 0.1.0")
         raise typer.Exit(0)
 
 
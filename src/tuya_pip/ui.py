@@ -1,12 +1,24 @@
 """
 Utilidades para mostrar mensajes formateados en consola con rich.
 """
-from rich.console import Console
-from rich.panel import Panel
-from rich.progress import Progress, SpinnerColumn, TextColumn
+from __future__ import annotations
+
 from contextlib import contextmanager
+from functools import cache
+from typing import TYPE_CHECKING, List
+
+# rich se importa bajo demanda para no penalizar el arranque del CLI
+if TYPE_CHECKING:
+    from rich.console import Console
+    from rich.progress import Progress, TaskID
 
-console = Console()
+
+@cache
+def get_console() -> Console:
+    """Devuelve la consola compartida, creándola en el primer uso"""
+    from rich.console import Console
+    
+    return Console()
 
 
 def show_blocked_panel(package: str, version: str, reason: str, audit_url: str):
@@ -40,24 +52,59 @@ def show_blocked_panel(package: str, version: str, reason: str, audit_url: str):
 [bold]For details:[/bold] [dim]curl {audit_url}[/dim]
 """
     
+    from rich.panel import Panel
+    
     panel = Panel.fit(
         content.strip(),
         title="🚫 [bold red]Installation Blocked[/bold red]",
         border_style="red",
         padding=(1, 2)
     )
+    console = get_console()
     console.print()
     console.print(panel)
     console.print()
 
 
+def show_blocked_table(blocked: List[tuple[str, str, str, str]]):
+    """
+    Muestra en una sola tabla todos los paquetes bloqueados.
+    
+    Args:
+        blocked: Lista de tuplas (paquete, versión, razón, audit_url)
+    """
+    from rich.table import Table
+    
+    table = Table(
+        title="🚫 [bold red]Installation Blocked[/bold red]",
+        border_style="red",
+        show_lines=True
+    )
+    table.add_column("Package", style="bold cyan")
+    table.add_column("Version")
+    table.add_column("Reason", style="yellow")
+    
+    for package, version, reason, _ in blocked:
+        table.add_row(package, version, reason)
+    
+    console = get_console()
+    console.print()
+    console.print(table)
+    
+    # Los comandos van fuera de la tabla para que no se trunquen y puedan copiarse
+    console.print("\n[bold]For details:[/bold]")
+    for _, _, _, audit_url in blocked:
+        console.print(f"  [dim]curl {audit_url}[/dim]", soft_wrap=True)
+    console.print()
+
+
 def show_success(package: str):
     """
     Muestra mensaje de éxito cuando pasa validación.
     
     Output: ✅ [green]Security checks passed for package[/green]
     """
-    console.print(f"✅ [green]Security checks passed for {package}[/green]")
+    get_console().print(f"✅ [green]Security checks passed for {package}[/green]")
 
 
 @contextmanager
@@ -72,34 +119,56 @@ def show_checking_spinner(package: str):
     
     Output: 🔍 Validating requests against security policies... [spinner]
     """
+    with batch_progress() as progress:
+        add_checking_task(progress, package)
+        yield
+
+
+@contextmanager
+def batch_progress():
+    """
+    Context manager con un único Progress compartido por varias validaciones.
+    
+    Uso:
+        with batch_progress() as progress:
+            task_id = add_checking_task(progress, "requests")
+            # hacer validación
+            progress.remove_task(task_id)
+    """
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+    
     with Progress(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
-        console=console,
+        console=get_console(),
         transient=True
     ) as progress:
-        progress.add_task(
-            description=f"🔍 Validating [cyan]{package}[/cyan] against security policies...",
-            total=None
-        )
-        yield
+        yield progress
+
+
+def add_checking_task(progress: Progress, package: str) -> TaskID:
+    """Agrega el spinner de validación de un paquete a un Progress existente"""
+    return progress.add_task(
+        description=f"🔍 Validating [cyan]{package}[/cyan] against security policies...",
+        total=None
+    )
 
 
 def show_error(message: str):
     """Muestra mensaje de error genérico"""
-    console.print(f"[red]❌ {message}[/red]")
+    get_console().print(f"[red]❌ {message}[/red]")
 
 
 def show_info(message: str):
     """Muestra mensaje informativo"""
-    console.print(f"[blue]ℹ️  {message}[/blue]")
+    get_console().print(f"[blue]ℹ️  {message}[/blue]")
 
 
 def show_warning(message: str):
     """Muestra mensaje de advertencia"""
-    console.print(f"[yellow]⚠️  {message}[/yellow]")
+    get_console().print(f"[yellow]⚠️  {message}[/yellow]")
 
 
 def show_installing(package: str):
     """Muestra mensaje cuando se está instalando un paquete"""
-    console.print(f"📦 [bold]Installing {package}...[/bold]")
+    get_console().print(f"📦 [bold]Installing {package}...[/bold]")
@@ -1,9 +1,29 @@
 """
 Cliente HTTP para validación de paquetes contra python-package-firewall.
 """
+import asyncio
+import hashlib
+import json
+import random
+import time
 import httpx
-from typing import Optional
-from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+from dataclasses import dataclass, asdict
+
+# Caché en disco de resultados de validación compartida entre ejecuciones
+CACHE_DIR = Path.home() / ".cache" / "tuya-pip"
+CACHE_TTL = 300  # segundos
+
+# Reintentos ante fallos transitorios al abrir la conexión. Un ReadTimeout no se
+# reintenta: ya consumió el timeout completo de lectura (30s)
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.1  # segundos, se duplica en cada intento
+
+# Códigos que indican que el firewall responde (health check)
+_OK_STATUSES = frozenset({200, 404})
+# Códigos que indican que el firewall no soporta POST /validate/batch
+_BATCH_UNSUPPORTED_STATUSES = frozenset({404, 405, 501})
 
 
 @dataclass
@@ -19,13 +39,35 @@ class FirewallValidator:
     Cliente para comunicarse con python-package-firewall API.
     
     Endpoints utilizados:
-    - GET /simple/{package}/  - Obtener índice de versiones
-    - GET /blocked/{package}  - Obtener detalles de bloqueo
+    - POST /validate/batch    - Validar varios paquetes en una sola petición (opcional)
+    - GET /blocked/{package}  - Validar paquetes y obtener detalles de bloqueo
+    - GET /simple/            - Verificar conectividad
     """
     
-    def __init__(self, firewall_url: str = "http://127.0.0.1:8000"):
+    def __init__(
+        self,
+        firewall_url: str = "http://127.0.0.1:8000",
+        max_concurrency: int = 10,
+        use_cache: bool = True
+    ):
         self.firewall_url = firewall_url.rstrip('/')
-        self.client = httpx.AsyncClient(timeout=30.0)
+        self.use_cache = use_cache
+        self._cache: dict[tuple[str, Optional[str]], ValidationResult] = {}
+        # None hasta saber si el firewall soporta POST /validate/batch
+        self._batch_supported: Optional[bool] = None
+        # Un único pool de conexiones (HTTP/2 cuando el firewall usa TLS) para
+        # reutilizar la conexión entre todas las consultas
+        self.client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(30.0, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=20,
+                max_keepalive_connections=20,
+                keepalive_expiry=60.0
+            )
+        )
+        # Limita las peticiones simultáneas para no saturar el firewall
+        self._sem = asyncio.Semaphore(max_concurrency)
     
     async def validate_package(
         self, 
@@ -33,7 +75,7 @@ class FirewallValidator:
         version: Optional[str] = None
     ) -> ValidationResult:
         """
-        Valida un paquete contra el firewall intentando obtener su índice.
+        Valida un paquete contra el firewall consultando sus bloqueos.
         
         Args:
             package: Nombre del paquete (ej: "requests")
@@ -42,84 +84,253 @@ class FirewallValidator:
         Returns:
             ValidationResult con status, reason y details
         
-        Lógica:
-        1. Consulta GET /simple/{package}/ para verificar acceso
-        2. Si retorna 403 -> paquete bloqueado por firewall
-        3. Si retorna 404 -> paquete no existe en PyPI
-        4. Si retorna 200 -> consultar /blocked/{package} para detalles
+        Lógica (una sola petición por paquete):
+        1. Consulta GET /blocked/{package}
+        2. Si retorna 404 -> paquete sin bloqueos, permitido
+        3. Si retorna 200 y la lista incluye "*" o la versión pedida -> bloqueado
+        4. Si retorna 200 sin coincidencias -> permitido
+        5. Error de conexión o respuesta inesperada -> bloqueado
         """
         package_name = package.lower()
         
+        cached = self._get_cached(package_name, version)
+        if cached is not None:
+            return cached
+        
+        result = await self._validate_uncached(package_name, version)
+        self._remember(package_name, version, result)
+        return result
+    
+    async def validate_batch(
+        self,
+        specs: List[tuple[str, Optional[str]]]
+    ) -> Optional[List[ValidationResult]]:
+        """
+        Valida varios paquetes en una sola petición POST /validate/batch.
+        
+        Args:
+            specs: Lista de tuplas (nombre_paquete, versión o None)
+        
+        Returns:
+            Lista de ValidationResult en el mismo orden que specs, o None si el
+            firewall no soporta el endpoint o este falla (se debe usar validate_package)
+        """
+        if self._batch_supported is None and self._load_batch_unsupported():
+            self._batch_supported = False
+        if self._batch_supported is False:
+            return None
+        
+        specs = [(package.lower(), version) for package, version in specs]
+        results: List[Optional[ValidationResult]] = [
+            self._get_cached(package_name, version) for package_name, version in specs
+        ]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+        if len(missing) == 1:
+            # Una sola consulta a /blocked/{package} cuesta lo mismo que el lote
+            # y evita una petición extra si el firewall no soporta el endpoint
+            return None
+        
+        payload = {
+            "packages": [
+                {"name": specs[i][0], "version": specs[i][1]} for i in missing
+            ]
+        }
+        
         try:
-            # Primero intentamos obtener el índice del paquete
-            response = await self.client.get(f"{self.firewall_url}/simple/{package_name}/")
+            response = await self._request_with_retry(
+                "POST",
+                f"{self.firewall_url}/validate/batch",
+                json=payload
+            )
             
-            if response.status_code == 403:
-                # Paquete bloqueado - obtener detalles del bloqueo
-                blocked_info = await self.get_blocked_info(package_name)
-                reasons = blocked_info.get("reasons", [])
-                reason_text = "; ".join(reasons) if reasons else "Package is blocked by firewall policy"
+            if response.status_code in _BATCH_UNSUPPORTED_STATUSES:
+                # Firewall sin soporte de validación por lotes
+                self._batch_supported = False
+                self._store_batch_unsupported()
+                return None
+            elif response.status_code == 200:
+                self._batch_supported = True
+                verdicts = response.json().get("results", [])
+                if len(verdicts) != len(missing):
+                    raise ValueError(
+                        f"Expected {len(missing)} results, got {len(verdicts)}"
+                    )
                 
+                for i, verdict in zip(missing, verdicts):
+                    package_name, version = specs[i]
+                    result = _result_from_verdict(package_name, verdict)
+                    self._remember(package_name, version, result)
+                    results[i] = result
+                return results
+            else:
+                # Un fallo del endpoint opcional (p. ej. 500) no debe abortar la
+                # instalación: se valida paquete a paquete con GET /blocked/{package}
+                return None
+        except httpx.ConnectError:
+            error_msg = f"Cannot connect to firewall at {self.firewall_url}"
+        except httpx.TimeoutException:
+            error_msg = "Firewall validation timeout"
+        except Exception as e:
+            error_msg = f"Validation error: {str(e)}"
+        
+        for i in missing:
+            results[i] = ValidationResult(
+                status="block",
+                reason=error_msg,
+                details={"package": specs[i][0], "error": error_msg}
+            )
+        return results
+    
+    async def _request_with_retry(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Realiza una petición reintentando ante errores al establecer la conexión.
+        
+        Espera con backoff exponencial y jitter entre intentos; el último error
+        se propaga al llamador.
+        """
+        for attempt in range(RETRY_ATTEMPTS):
+            try:
+                async with self._sem:
+                    return await self.client.request(method, url, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                if attempt == RETRY_ATTEMPTS - 1:
+                    raise
+                await asyncio.sleep(RETRY_BASE_DELAY * 2 ** attempt + random.random() * 0.05)
+    
+    def _batch_cache_path(self) -> Path:
+        """Ruta del archivo que recuerda si el firewall no soporta validación por lotes"""
+        key = hashlib.sha1(self.firewall_url.encode('utf-8')).hexdigest()
+        return CACHE_DIR / f"batch-{key}.json"
+    
+    def _load_batch_unsupported(self) -> bool:
+        """Indica si una ejecución reciente detectó que no hay POST /validate/batch"""
+        if not self.use_cache:
+            return False
+        try:
+            data = json.loads(self._batch_cache_path().read_text(encoding="utf-8"))
+            return time.time() - data["timestamp"] <= CACHE_TTL
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+    
+    def _store_batch_unsupported(self):
+        """Recuerda en disco que el firewall no soporta validación por lotes"""
+        if not self.use_cache:
+            return
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            self._batch_cache_path().write_text(
+                json.dumps({"timestamp": time.time()}),
+                encoding="utf-8"
+            )
+        except OSError:
+            pass
+    
+    def _get_cached(self, package_name: str, version: Optional[str]) -> Optional[ValidationResult]:
+        """Busca un resultado en la caché en memoria y luego en disco"""
+        if not self.use_cache:
+            return None
+        
+        key = (package_name, version)
+        cached = self._cache.get(key) or self._load_cached(package_name, version)
+        if cached is not None:
+            self._cache[key] = cached
+        return cached
+    
+    def _remember(self, package_name: str, version: Optional[str], result: ValidationResult):
+        """Guarda un resultado en caché salvo que sea un error"""
+        # Los errores de conexión no se cachean para reintentar en la siguiente ejecución
+        if self.use_cache and "error" not in result.details:
+            self._cache[(package_name, version)] = result
+            self._store_cached(package_name, version, result)
+    
+    async def _validate_uncached(
+        self,
+        package_name: str,
+        version: Optional[str]
+    ) -> ValidationResult:
+        """Consulta el firewall y construye el resultado de validación"""
+        blocked_info = await self.get_blocked_info(package_name)
+        status = blocked_info.get("status")
+        
+        if status == "allowed":
+            return ValidationResult(
+                status="allow",
+                reason="Package passed security validation",
+                details={"package": package_name}
+            )
+        elif status == "blocked":
+            blocked_versions = blocked_info.get("blocked_versions_list", [])
+            reasons = blocked_info.get("reasons", [])
+            
+            if "*" in blocked_versions:
+                reason_text = "; ".join(reasons) if reasons else "Package is blocked by firewall policy"
                 return ValidationResult(
                     status="block",
                     reason=reason_text,
                     details=blocked_info
                 )
-            elif response.status_code == 404:
-                return ValidationResult(
-                    status="block",
-                    reason="Package not found in PyPI",
-                    details={"package": package_name, "error": "not_found"}
-                )
-            elif response.status_code == 200:
-                # Paquete existe, verificar si hay versiones específicas bloqueadas
-                if version:
-                    blocked_info = await self.get_blocked_info(package_name)
-                    if blocked_info.get("status") == "blocked":
-                        blocked_versions = blocked_info.get("blocked_versions_list", [])
-                        if version in blocked_versions or "*" in blocked_versions:
-                            reasons = blocked_info.get("reasons", [])
-                            version_reason = next(
-                                (r for r in reasons if version in r), 
-                                f"Version {version} is blocked"
-                            )
-                            return ValidationResult(
-                                status="block",
-                                reason=version_reason,
-                                details=blocked_info
-                            )
-                
-                return ValidationResult(
-                    status="allow",
-                    reason="Package passed security validation",
-                    details={"package": package_name}
+            
+            if version and version in blocked_versions:
+                version_reason = next(
+                    (r for r in reasons if version in r), 
+                    f"Version {version} is blocked"
                 )
-            else:
                 return ValidationResult(
                     status="block",
-                    reason=f"Unexpected response from firewall: {response.status_code}",
-                    details={"package": package_name, "status_code": response.status_code}
+                    reason=version_reason,
+                    details=blocked_info
                 )
-                
-        except httpx.ConnectError:
+            
             return ValidationResult(
-                status="block",
-                reason=f"Cannot connect to firewall at {self.firewall_url}",
-                details={"package": package_name, "error": "connection_error"}
+                status="allow",
+                reason="Package passed security validation",
+                details={"package": package_name}
             )
-        except httpx.TimeoutException:
+        elif status == "error":
+            error_msg = blocked_info.get("error", "Unknown error")
             return ValidationResult(
                 status="block",
-                reason="Firewall validation timeout",
-                details={"package": package_name, "error": "timeout"}
+                reason=error_msg,
+                details={"package": package_name, "error": error_msg}
             )
-        except Exception as e:
+        else:
             return ValidationResult(
                 status="block",
-                reason=f"Validation error: {str(e)}",
-                details={"package": package_name, "error": str(e)}
+                reason=f"Unexpected response from firewall: {blocked_info.get('error', status)}",
+                details=blocked_info
             )
     
+    def _cache_path(self, package_name: str, version: Optional[str]) -> Path:
+        """Ruta del archivo de caché para un paquete y versión"""
+        key = f"{self.firewall_url}|{package_name}|{version or ''}"
+        return CACHE_DIR / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json"
+    
+    def _load_cached(self, package_name: str, version: Optional[str]) -> Optional[ValidationResult]:
+        """Lee un resultado de la caché en disco si existe y no ha expirado"""
+        path = self._cache_path(package_name, version)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if time.time() - data["timestamp"] > CACHE_TTL:
+                # Borrar la entrada expirada para que la caché no crezca sin límite
+                path.unlink(missing_ok=True)
+                return None
+            return ValidationResult(**data["result"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+    
+    def _store_cached(self, package_name: str, version: Optional[str], result: ValidationResult):
+        """Guarda un resultado en la caché en disco (los fallos se ignoran)"""
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            self._cache_path(package_name, version).write_text(
+                json.dumps({"timestamp": time.time(), "result": asdict(result)}),
+                encoding="utf-8"
+            )
+        except (OSError, TypeError, ValueError):
+            pass
+    
     async def get_blocked_info(self, package: str) -> dict:
         """
         Obtiene información detallada de por qué un paquete está bloqueado.
@@ -141,46 +352,13 @@ class FirewallValidator:
         package_name = package.lower()
         
         try:
-            response = await self.client.get(f"{self.firewall_url}/blocked/{package_name}")
-            
-            if response.status_code == 404:
-                # Paquete no está bloqueado
-                return {
-                    "package": package_name,
-                    "status": "allowed",
-                    "blocked_versions": 0,
-                    "reasons": []
-                }
-            elif response.status_code == 200:
-                data = response.json()
-                # Parsear la respuesta para extraer información útil
-                return {
-                    "package": package_name,
-                    "status": "blocked",
-                    "blocked_versions": data.get("blocked_versions", 0),
-                    "blocked_versions_list": data.get("blocked_versions_list", []),
-                    "reasons": data.get("reasons", []),
-                    "raw_data": data
-                }
-            else:
-                return {
-                    "package": package_name,
-                    "status": "unknown",
-                    "error": f"Unexpected status code: {response.status_code}"
-                }
-                
-        except httpx.ConnectError:
-            return {
-                "package": package_name,
-                "status": "error",
-                "error": f"Cannot connect to firewall at {self.firewall_url}"
-            }
+            response = await self._request_with_retry(
+                "GET",
+                f"{self.firewall_url}/blocked/{package_name}"
+            )
+            return _blocked_info_from_response(package_name, response)
         except Exception as e:
-            return {
-                "package": package_name,
-                "status": "error",
-                "error": str(e)
-            }
+            return _blocked_info_from_error(package_name, self.firewall_url, e)
     
     async def check_connectivity(self) -> bool:
         """
@@ -191,10 +369,132 @@ class FirewallValidator:
         """
         try:
             response = await self.client.get(f"{self.firewall_url}/simple/", timeout=5.0)
-            return response.status_code in (200, 404)  # Ambos indican que el servidor responde
+            return response.status_code in _OK_STATUSES
         except Exception:
             return False
     
     async def close(self):
         """Cierra el cliente HTTP"""
         await self.client.aclose()
+
+
+class FirewallValidatorSync:
+    """
+    Cliente síncrono para comandos de una sola petición (audit, check).
+    
+    Evita crear un event loop cuando no hay peticiones concurrentes.
+    """
+    
+    def __init__(self, firewall_url: str = "http://127.0.0.1:8000"):
+        self.firewall_url = firewall_url.rstrip('/')
+        self.client = httpx.Client(timeout=httpx.Timeout(30.0, connect=5.0))
+    
+    def get_blocked_info(self, package: str) -> dict:
+        """
+        Obtiene información detallada de por qué un paquete está bloqueado.
+        
+        Ver FirewallValidator.get_blocked_info para la estructura del resultado.
+        """
+        package_name = package.lower()
+        
+        try:
+            response = self.client.get(f"{self.firewall_url}/blocked/{package_name}")
+            return _blocked_info_from_response(package_name, response)
+        except Exception as e:
+            return _blocked_info_from_error(package_name, self.firewall_url, e)
+    
+    def check_connectivity(self) -> bool:
+        """
+        Verifica si el firewall es accesible.
+        
+        Returns:
+            bool: True si el firewall responde, False en caso contrario
+        """
+        try:
+            response = self.client.get(f"{self.firewall_url}/simple/", timeout=5.0)
+            return response.status_code in _OK_STATUSES
+        except Exception:
+            return False
+    
+    def close(self):
+        """Cierra el cliente HTTP"""
+        self.client.close()
+
+
+def _result_from_verdict(package_name: str, verdict: dict) -> ValidationResult:
+    """
+    Convierte un veredicto de POST /validate/batch en ValidationResult.
+    
+    Solo status "allow" permite el paquete; cualquier otro valor, o un veredicto
+    de otro paquete, se trata como error y bloquea sin cachearse.
+    """
+    status = verdict.get("status")
+    verdict_package = str(verdict.get("package", "")).lower()
+    
+    if verdict_package != package_name:
+        error_msg = f"Batch verdict for '{verdict_package}' does not match '{package_name}'"
+    elif status == "allow":
+        return ValidationResult(
+            status="allow",
+            reason="Package passed security validation",
+            details={"package": package_name, **verdict}
+        )
+    elif status == "block":
+        return ValidationResult(
+            status="block",
+            reason=verdict.get("reason") or "Package is blocked by firewall policy",
+            details={"package": package_name, **verdict}
+        )
+    else:
+        error_msg = f"Unexpected verdict from firewall: {status}"
+    
+    return ValidationResult(
+        status="block",
+        reason=error_msg,
+        details={**verdict, "package": package_name, "error": error_msg}
+    )
+
+
+def _blocked_info_from_response(package_name: str, response: httpx.Response) -> dict:
+    """Convierte la respuesta de GET /blocked/{package} en el dict de bloqueo"""
+    if response.status_code == 404:
+        # Paquete no está bloqueado
+        return {
+            "package": package_name,
+            "status": "allowed",
+            "blocked_versions": 0,
+            "reasons": []
+        }
+    elif response.status_code == 200:
+        data = response.json()
+        # Parsear la respuesta para extraer información útil
+        return {
+            "package": package_name,
+            "status": "blocked",
+            "blocked_versions": data.get("blocked_versions", 0),
+            "blocked_versions_list": data.get("blocked_versions_list", []),
+            "reasons": data.get("reasons", []),
+            "raw_data": data
+        }
+    else:
+        return {
+            "package": package_name,
+            "status": "unknown",
+            "error": f"Unexpected status code: {response.status_code}"
+        }
+
+
+def _blocked_info_from_error(package_name: str, firewall_url: str, error: Exception) -> dict:
+    """Convierte un error de la consulta a /blocked/{package} en el dict de bloqueo"""
+    if isinstance(error, httpx.ConnectError):
+        message = f"Cannot connect to firewall at {firewall_url}"
+    elif isinstance(error, httpx.TimeoutException):
+        message = "Firewall validation timeout"
+    else:
+        message = str(error)
+    
+    return {
+        "package": package_name,
+        "status": "error",
+        "error": message
+    }
@@ -1,9 +1,14 @@
 """
 Tests para el CLI de tuya-pip.
 """
+import asyncio
+import io
 import pytest
 from typer.testing import CliRunner
-from tuya_pip.cli import app
+from rich.console import Console
+from tuya_pip import cli, ui, validator
+from tuya_pip.cli import app, parse_package_spec, parse_requirements_file, stream_pip_output
+from tuya_pip.validator import ValidationResult
 
 runner = CliRunner()
 
@@ -45,6 +50,129 @@ def test_help_command():
     assert "firewall" in result.stdout.lower()
 
 
+@pytest.mark.parametrize("spec,expected", [
+    ("requests", ("requests", None)),
+    ("keras==3.11.2", ("keras", "3.11.2")),
+    ("keras == 3.11.2", ("keras", "3.11.2")),
+    ("django>=4.0", ("django", None)),
+    ("numpy~=1.26", ("numpy", None)),
+    ("requests[socks]==2.32.0", ("requests[socks]", "2.32.0")),
+])
+def test_parse_package_spec(spec, expected):
+    """Solo las versiones fijadas con == se devuelven como versión"""
+    assert parse_package_spec(spec) == expected
+
+
+def test_parse_requirements_file(tmp_path):
+    """Ignora comentarios y líneas vacías del archivo de requirements"""
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text(
+        "# dependencias\n"
+        "requests==2.32.0\n"
+        "\n"
+        "  keras>=3.0  # inline\n"
+        "   # indentado\n",
+        encoding="utf-8"
+    )
+    assert parse_requirements_file(str(requirements)) == ["requests==2.32.0", "keras>=3.0"]
+
+
+class FakeValidator:
+    """Validador falso: "bad" se bloquea de inmediato y "slow" nunca responde"""
+    
+    cancelled = []
+    
+    def __init__(self, firewall_url, **kwargs):
+        self.firewall_url = firewall_url
+    
+    async def validate_batch(self, specs):
+        return None
+    
+    async def validate_package(self, package, version=None):
+        if package == "bad":
+            return ValidationResult(status="block", reason="Malware", details={})
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            self.cancelled.append(package)
+            raise
+        return ValidationResult(status="allow", reason="ok", details={})
+    
+    async def close(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_validate_packages_cancels_on_first_block(monkeypatch):
+    """El primer paquete bloqueado cancela las validaciones pendientes"""
+    monkeypatch.setattr(validator, "FirewallValidator", FakeValidator)
+    FakeValidator.cancelled = []
+    
+    passed = await asyncio.wait_for(
+        cli.validate_packages(["slow", "bad"], "http://localhost:8000"),
+        timeout=5
+    )
+    assert passed is False
+    assert FakeValidator.cancelled == ["slow"]
+
+
+class BatchValidator(FakeValidator):
+    """Validador falso cuyo endpoint batch solo permite el paquete requests"""
+    
+    async def validate_batch(self, specs):
+        return [
+            ValidationResult(status="allow", reason="ok", details={})
+            if package == "requests"
+            else ValidationResult(status="block", reason="Malware", details={})
+            for package, _ in specs
+        ]
+
+
+@pytest.mark.asyncio
+async def test_validate_packages_reports_every_block(monkeypatch):
+    """Con varios bloqueos se muestran los permitidos y un comando de auditoría por bloqueo"""
+    monkeypatch.setattr(validator, "FirewallValidator", BatchValidator)
+    console = Console(file=io.StringIO(), width=200)
+    monkeypatch.setattr(ui, "get_console", lambda: console)
+    
+    passed = await cli.validate_packages(
+        ["keras==3.11.2", "requests", "numpy"], "http://localhost:8000"
+    )
+    
+    output = console.file.getvalue()
+    assert passed is False
+    assert "Security checks passed for requests" in output
+    assert "curl http://localhost:8000/blocked/keras" in output
+    assert "curl http://localhost:8000/blocked/numpy" in output
+
+
+class ChunkedStream:
+    """Salida de pip falsa que entrega bytes en los bloques indicados"""
+    
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+    
+    def read1(self, size=-1):
+        return self.chunks.pop(0) if self.chunks else b""
+
+
+def test_stream_pip_output_detects_blocked_packages():
+    """Detecta 403 partidos entre bloques y en la última línea sin salto final"""
+    url = b"http://127.0.0.1:8000/pypi/packages"
+    chunks = [
+        b"Collecting numpy\nERROR: HTTP error 403 while getting " + url + b"/num",
+        b"py-2.3.5-cp313-cp313-win_amd64.whl.metadata\n",
+        b"ERROR: HTTP error 403 while getting " + url + b"/numpy-2.3.5-cp313.whl\n",
+        b"403 Client Error: Forbidden for url: " + url + b"/Keras-3.11.2-py3-none-any.whl",
+    ]
+    out = io.BytesIO()
+    
+    blocked = stream_pip_output(ChunkedStream(chunks), out)
+    
+    assert blocked == ["numpy==2.3.5", "keras==3.11.2"]
+    assert out.getvalue() == b"".join(chunks)
+
+
 # TODO: Agregar tests con mocks para:
 # - test_install_blocked_package()
 # - test_install_allowed_package()
@@ -1,8 +1,10 @@
 """
 Tests para el validador de tuya-pip.
 """
+import httpx
 import pytest
-from tuya_pip.validator import FirewallValidator, ValidationResult
+from tuya_pip import validator as validator_module
+from tuya_pip.validator import FirewallValidator, FirewallValidatorSync, ValidationResult
 
 
 @pytest.mark.asyncio
@@ -21,9 +23,285 @@ async def test_validator_strips_trailing_slash():
     await validator.close()
 
 
+def make_validator(handler, use_cache: bool = False) -> FirewallValidator:
+    """Crea un validador cuyo cliente HTTP responde con el handler dado"""
+    validator = FirewallValidator("http://localhost:8000", use_cache=use_cache)
+    validator.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return validator
+
+
+@pytest.mark.asyncio
+async def test_validate_package_allowed():
+    """Un 404 en /blocked/{package} significa que el paquete está permitido"""
+    requests_made = []
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests_made.append(request.url.path)
+        return httpx.Response(404, json={"status": "allowed"})
+    
+    validator = make_validator(handler)
+    result = await validator.validate_package("Requests", "2.32.0")
+    assert result.status == "allow"
+    assert requests_made == ["/blocked/requests"]
+    await validator.close()
+
+
+@pytest.mark.asyncio
+async def test_validate_package_blocked_version():
+    """Una versión incluida en blocked_versions_list se bloquea con su razón"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={
+            "blocked_versions": 1,
+            "blocked_versions_list": ["3.11.2"],
+            "reasons": ["Version 3.11.2: Vulnerabilities found: CVE-2025-12060"]
+        })
+    
+    validator = make_validator(handler)
+    blocked = await validator.validate_package("keras", "3.11.2")
+    allowed = await validator.validate_package("keras", "3.12.0")
+    assert blocked.status == "block"
+    assert "CVE-2025-12060" in blocked.reason
+    assert allowed.status == "allow"
+    await validator.close()
+
+
+@pytest.mark.asyncio
+async def test_validate_package_wildcard_blocks_any_version():
+    """Un bloqueo "*" aplica aunque no se especifique versión"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={
+            "blocked_versions_list": ["*"],
+            "reasons": ["Package identified as malware"]
+        })
+    
+    validator = make_validator(handler)
+    result = await validator.validate_package("malicious-package")
+    assert result.status == "block"
+    assert result.reason == "Package identified as malware"
+    await validator.close()
+
+
+@pytest.mark.asyncio
+async def test_validate_package_uses_cache(tmp_path, monkeypatch):
+    """Los resultados repetidos se sirven desde la caché sin consultar al firewall"""
+    monkeypatch.setattr(validator_module, "CACHE_DIR", tmp_path)
+    requests_made = []
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests_made.append(request.url.path)
+        return httpx.Response(404)
+    
+    validator = make_validator(handler, use_cache=True)
+    await validator.validate_package("requests", "2.32.0")
+    await validator.validate_package("requests", "2.32.0")
+    assert len(requests_made) == 1
+    await validator.close()
+    
+    # Una nueva instancia reutiliza la caché en disco
+    validator = make_validator(handler, use_cache=True)
+    result = await validator.validate_package("requests", "2.32.0")
+    assert result.status == "allow"
+    assert len(requests_made) == 1
+    await validator.close()
+
+
+@pytest.mark.asyncio
+async def test_validate_package_prunes_expired_cache(tmp_path, monkeypatch):
+    """Las entradas expiradas de la caché se borran del disco al leerlas"""
+    monkeypatch.setattr(validator_module, "CACHE_DIR", tmp_path)
+    requests_made = []
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests_made.append(request.url.path)
+        return httpx.Response(404)
+    
+    validator = make_validator(handler, use_cache=True)
+    await validator.validate_package("requests", "2.32.0")
+    await validator.close()
+    
+    monkeypatch.setattr(validator_module, "CACHE_TTL", -1)
+    validator = make_validator(handler, use_cache=True)
+    assert validator._load_cached("requests", "2.32.0") is None
+    assert not validator._cache_path("requests", "2.32.0").exists()
+    await validator.close()
+
+
+@pytest.mark.asyncio
+async def test_validate_batch():
+    """Una sola petición POST devuelve los veredictos en el orden pedido"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.method == "POST"
+        assert request.url.path == "/validate/batch"
+        return httpx.Response(200, json={"results": [
+            {"package": "requests", "version": None, "status": "allow"},
+            {
+                "package": "keras",
+                "version": "3.11.2",
+                "status": "block",
+                "reason": "CVE-2025-12060",
+            },
+        ]})
+    
+    validator = make_validator(handler)
+    results = await validator.validate_batch([("requests", None), ("Keras", "3.11.2")])
+    assert [r.status for r in results] == ["allow", "block"]
+    assert results[1].reason == "CVE-2025-12060"
+    await validator.close()
+
+
+@pytest.mark.parametrize("verdict", [
+    {"package": "requests", "status": "error", "reason": "scanner down"},
+    {"package": "requests"},
+    {"package": "requests", "status": "blocked"},
+    {"package": "numpy", "status": "allow"},
+])
+@pytest.mark.asyncio
+async def test_validate_batch_unexpected_verdict_blocks(tmp_path, monkeypatch, verdict):
+    """Un veredicto desconocido o de otro paquete bloquea y no se cachea"""
+    monkeypatch.setattr(validator_module, "CACHE_DIR", tmp_path)
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"results": [
+            verdict,
+            {"package": "keras", "version": None, "status": "allow"},
+        ]})
+    
+    validator = make_validator(handler, use_cache=True)
+    results = await validator.validate_batch([("requests", None), ("keras", None)])
+    assert results[0].status == "block"
+    assert "error" in results[0].details
+    assert results[1].status == "allow"
+    # Solo el veredicto válido (keras) se guarda en caché
+    assert ("requests", None) not in validator._cache
+    assert len(list(tmp_path.iterdir())) == 1
+    await validator.close()
+
+
+@pytest.mark.asyncio
+async def test_validate_batch_unsupported(tmp_path, monkeypatch):
+    """Un 404 en el endpoint por lotes se recuerda entre ejecuciones"""
+    monkeypatch.setattr(validator_module, "CACHE_DIR", tmp_path)
+    requests_made = []
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests_made.append(request.url.path)
+        return httpx.Response(404)
+    
+    specs = [("requests", None), ("keras", None)]
+    validator = make_validator(handler, use_cache=True)
+    assert await validator.validate_batch(specs) is None
+    assert await validator.validate_batch(specs) is None
+    await validator.close()
+    
+    # Una nueva instancia no vuelve a probar el endpoint
+    validator = make_validator(handler, use_cache=True)
+    assert await validator.validate_batch(specs) is None
+    assert requests_made == ["/validate/batch"]
+    await validator.close()
+
+
+@pytest.mark.parametrize("status_code,remembered", [(501, True), (500, False), (503, False)])
+@pytest.mark.asyncio
+async def test_validate_batch_server_errors_fall_back(
+    tmp_path, monkeypatch, status_code, remembered
+):
+    """501 se recuerda como no soportado; otros 5xx solo recurren a la validación individual"""
+    monkeypatch.setattr(validator_module, "CACHE_DIR", tmp_path)
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(status_code)
+    
+    validator = make_validator(handler, use_cache=True)
+    assert await validator.validate_batch([("requests", None), ("keras", None)]) is None
+    assert validator._load_batch_unsupported() is remembered
+    await validator.close()
+
+
+@pytest.mark.asyncio
+async def test_validate_batch_skips_single_package():
+    """Con un solo paquete por validar no se usa el endpoint por lotes"""
+    requests_made = []
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests_made.append(request.url.path)
+        return httpx.Response(404)
+    
+    validator = make_validator(handler)
+    assert await validator.validate_batch([("requests", None)]) is None
+    assert requests_made == []
+    await validator.close()
+
+
+def test_sync_get_blocked_info():
+    """El cliente síncrono interpreta /blocked/{package} igual que el asíncrono"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/blocked/keras"
+        return httpx.Response(200, json={
+            "blocked_versions": 1,
+            "blocked_versions_list": ["3.11.2"],
+            "reasons": ["Version 3.11.2: CVE-2025-12060"]
+        })
+    
+    validator = FirewallValidatorSync("http://localhost:8000")
+    validator.client = httpx.Client(transport=httpx.MockTransport(handler))
+    info = validator.get_blocked_info("Keras")
+    assert info["status"] == "blocked"
+    assert info["blocked_versions_list"] == ["3.11.2"]
+    validator.close()
+
+
+@pytest.mark.asyncio
+async def test_validate_package_retries_transient_errors(monkeypatch):
+    """Un error de conexión puntual se reintenta en lugar de bloquear"""
+    monkeypatch.setattr(validator_module, "RETRY_BASE_DELAY", 0)
+    attempts = []
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(request.url.path)
+        if len(attempts) == 1:
+            raise httpx.ConnectError("Connection refused", request=request)
+        return httpx.Response(404)
+    
+    validator = make_validator(handler)
+    result = await validator.validate_package("requests")
+    assert result.status == "allow"
+    assert len(attempts) == 2
+    await validator.close()
+
+
+@pytest.mark.asyncio
+async def test_validate_package_does_not_retry_read_timeout(monkeypatch):
+    """Un ReadTimeout ya agotó el timeout de lectura y no se reintenta"""
+    monkeypatch.setattr(validator_module, "RETRY_BASE_DELAY", 0)
+    attempts = []
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(request.url.path)
+        raise httpx.ReadTimeout("Read timed out", request=request)
+    
+    validator = make_validator(handler)
+    result = await validator.validate_package("requests")
+    assert result.status == "block"
+    assert result.reason == "Firewall validation timeout"
+    assert len(attempts) == 1
+    await validator.close()
+
+
+@pytest.mark.asyncio
+async def test_validate_package_blocks_after_retries(monkeypatch):
+    """Si todos los intentos fallan el paquete se bloquea"""
+    monkeypatch.setattr(validator_module, "RETRY_BASE_DELAY", 0)
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("Connection refused", request=request)
+    
+    validator = make_validator(handler)
+    result = await validator.validate_package("requests")
+    assert result.status == "block"
+    assert "Cannot connect to firewall" in result.reason
+    await validator.close()
+
+
 # TODO: Agregar tests con mocks para:
-# - test_validate_package_allowed()
-# - test_validate_package_blocked()
-# - test_validate_package_not_found()
 # - test_get_blocked_info()
 # - test_check_connectivity()